@@ -0,0 +1,36 @@
+"""One-off migration: assign rows written before multi-school support to a school.
+
+Usage (from the backend directory, with MONGO_URL and DB_NAME set):
+
+    python backfill_school_id.py <school_id>
+"""
+import asyncio
+import logging
+import os
+import sys
+
+import server
+
+logger = logging.getLogger("backfill_school_id")
+
+async def backfill(school_id: str):
+    server.client = server.create_mongo_client()
+    server.db = server.client[os.environ['DB_NAME']]
+    try:
+        if not await server.db.schools.find_one({"id": school_id}):
+            logger.error("School %s not found", school_id)
+            return 1
+        for collection in list(server.TENANT_INDEXES) + ["schedule_views"]:
+            result = await server.db[collection].update_many(
+                {"school_id": {"$exists": False}}, {"$set": {"school_id": school_id}}
+            )
+            logger.info("%s: %d rows assigned to school %s", collection, result.modified_count, school_id)
+        return 0
+    finally:
+        server.client.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(2)
+    sys.exit(asyncio.run(backfill(sys.argv[1])))
@@ -0,0 +1,85 @@
+import html
+from typing import List
+
+# Export subsystem (SK documents, timetable wire formats), imported lazily by
+# server.py on first use. PDF/DOCX/XLSX writers belong here too.
+
+def encode_schedule_columnar(slots: List[dict], max_days: int, max_slots: int):
+    # Dictionary-encode the ids and lay the teacher/subject of every
+    # day x slot x class cell out as flat integer arrays (-1 = empty cell).
+    # Cell (day, slot, class) lives at index (day * slots + slot) * len(classes) + class.
+    # Cells outside max_days x max_slots or filled twice are rejected with
+    # ValueError instead of silently wrapping or overwriting another cell.
+    classes, teachers, subjects = {}, {}, {}
+    for slot in slots:
+        if not 0 <= slot["day"] < max_days or not 0 <= slot["slot"] < max_slots:
+            raise ValueError(f"Schedule slot {slot['id']} is outside the {max_days} x {max_slots} grid")
+        classes.setdefault(slot["class_id"], len(classes))
+        teachers.setdefault(slot["teacher_id"], len(teachers))
+        subjects.setdefault(slot["subject_id"], len(subjects))
+    days = max((slot["day"] for slot in slots), default=-1) + 1
+    slots_per_day = max((slot["slot"] for slot in slots), default=-1) + 1
+    size = days * slots_per_day * len(classes)
+    id_grid = [None] * size
+    teacher_grid = [-1] * size
+    subject_grid = [-1] * size
+    locked_grid = [0] * size
+    for slot in slots:
+        cell = (slot["day"] * slots_per_day + slot["slot"]) * len(classes) + classes[slot["class_id"]]
+        if id_grid[cell] is not None:
+            raise ValueError(f"Schedule slots {id_grid[cell]} and {slot['id']} share one cell")
+        id_grid[cell] = slot["id"]
+        teacher_grid[cell] = teachers[slot["teacher_id"]]
+        subject_grid[cell] = subjects[slot["subject_id"]]
+        locked_grid[cell] = int(slot.get("is_locked", False))
+    return {
+        "format": "columnar",
+        "days": days,
+        "slots": slots_per_day,
+        "classes": list(classes),
+        "teachers": list(teachers),
+        "subjects": list(subjects),
+        "ids": id_grid,
+        "teacher": teacher_grid,
+        "subject": subject_grid,
+        "locked": locked_grid
+    }
+
+def render_sk_table(headers: List[str], rows: List[list]):
+    head = "".join(f"<th>{html.escape(str(h))}</th>" for h in headers)
+    body = "".join(
+        "<tr>" + "".join(f"<td>{html.escape(str(cell))}</td>" for cell in row) + "</tr>"
+        for row in rows
+    )
+    return f"<table border=\"1\"><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>"
+
+def render_sk_document(template: dict, data: dict):
+    teachers = data["teachers"]
+    individual = template["sk_type"] == "individu"
+    jtm_rows = [
+        ([] if individual else [t["name"]]) + [row["subject"], row["class"], row["hours"]]
+        for t in teachers for row in t["teaching"]
+    ]
+    ttg_rows = [
+        ([] if individual else [t["name"]]) + [row["name"], row["hours"]]
+        for t in teachers for row in t["tasks"]
+    ]
+    teacher_header = [] if individual else ["Nama Guru"]
+    academic_year = data["academic_year"]
+    replacements = {
+        "{{sekolah}}": html.escape(data["school"]["name"]),
+        "{{npsn}}": html.escape(data["school"]["npsn"]),
+        "{{kepala_sekolah}}": html.escape(data["school"].get("principal") or ""),
+        "{{tahun_akademik}}": html.escape(f"{academic_year['school_year']} Semester {academic_year['semester']}"),
+        "{{nama_guru}}": html.escape(teachers[0]["name"]) if individual else "",
+        "{{nip_nuptk}}": html.escape(teachers[0]["nip_nuptk"]) if individual else "",
+        "{{tabel_jtm}}": render_sk_table(teacher_header + ["Mata Pelajaran", "Kelas", "JP"], jtm_rows),
+        "{{tabel_ttg}}": render_sk_table(teacher_header + ["Tugas Tambahan", "Ekuivalen JP"], ttg_rows),
+        "{{tempat}}": html.escape(data["place"]),
+        "{{tanggal}}": html.escape(data["date"])
+    }
+    content = template["content"]
+    for placeholder, value in replacements.items():
+        content = content.replace(placeholder, value)
+    document = f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{html.escape(template['name'])}</title></head><body>{content}</body></html>"
+    return document.encode("utf-8")
@@ -0,0 +1,42 @@
+# Scheduling subsystem, imported lazily by server.py on first use.
+# Slot rows are plain dicts; server.TemplateSlotTime is their schema.
+
+MINUTES_PER_DAY = 24 * 60
+
+def parse_clock(value: str):
+    try:
+        hours, minutes = (int(part) for part in value.split(":"))
+    except ValueError:
+        raise ValueError("Invalid time format, expected HH:MM")
+    if not 0 <= hours < 24 or not 0 <= minutes < 60:
+        raise ValueError("Invalid time format, expected HH:MM")
+    return hours * 60 + minutes
+
+def format_clock(minutes: int):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def expand_schedule_template(template: dict):
+    slots = template["slots"] or [{"slot_type": "belajar"}] * template["lessons_per_day"]
+    clock = parse_clock(template["start_time"])
+    lesson_number = 0
+    table = []
+    for index, slot in enumerate(slots):
+        is_lesson = slot["slot_type"] == "belajar"
+        duration = template["lesson_duration"] if is_lesson else slot["duration"]
+        if not duration or duration <= 0:
+            raise ValueError("Slot durations must be positive")
+        if clock + duration >= MINUTES_PER_DAY:
+            raise ValueError("Schedule template runs past the end of the day")
+        if is_lesson:
+            lesson_number += 1
+        table.append({
+            "index": index,
+            "lesson_number": lesson_number if is_lesson else None,
+            "slot_type": slot["slot_type"],
+            "label": slot.get("label") or (f"Jam ke-{lesson_number}" if is_lesson else slot["slot_type"]),
+            "start_time": format_clock(clock),
+            "end_time": format_clock(clock + duration),
+            "is_lesson": is_lesson
+        })
+        clock += duration
+    return table
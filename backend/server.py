@@ -1,14 +1,27 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from bson import ObjectId
+from bson.errors import InvalidId
+from gridfs.errors import NoFile
 import os
+import asyncio
+import importlib
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
-from pydantic import BaseModel, Field
+from urllib.parse import quote
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
 import uuid
+import hashlib
+import json
 from datetime import datetime, timezone
 import jwt
 from passlib.context import CryptContext
@@ -17,12 +30,46 @@ ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# The client is created by the lifespan handler, i.e. after uvicorn/gunicorn
+# have forked their workers, so every worker owns its own connection pool.
+client: Optional[AsyncIOMotorClient] = None
+db = None
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '10'))
+# Kept below typical probe timeouts (~1s) so a database blip yields a clean 503
+READINESS_PING_TIMEOUT = float(os.environ.get('READINESS_PING_TIMEOUT_SECONDS', '0.5'))
+
+def create_mongo_client():
+    return AsyncIOMotorClient(
+        os.environ['MONGO_URL'],
+        maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+        connectTimeoutMS=int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000')),
+        socketTimeoutMS=int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '30000'))
+    )
+
+async def warm_up_pool():
+    # Concurrent pings force the pool to open minPoolSize connections up front,
+    # so the first requests after a deploy don't pay the connection setup.
+    await asyncio.gather(*(db.command("ping") for _ in range(max(MONGO_MIN_POOL_SIZE, 1))))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db
+    app.state.ready = False
+    client = create_mongo_client()
+    db = client[os.environ['DB_NAME']]
+    await warm_up_pool()
+    await create_indexes()
+    app.state.ready = True
+    logger.info("MongoDB pool warmed up, worker ready")
+    yield
+    app.state.ready = False
+    client.close()
 
 # Create the main app without a prefix
-app = FastAPI(title="Adifathi Jadwal SK API")
+app = FastAPI(title="Adifathi Jadwal SK API", lifespan=lifespan)
+app.state.ready = False
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -33,10 +80,19 @@ ALGORITHM = "HS256"
 security = HTTPBearer()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Lazily loaded subsystems
+# exports (SK rendering, timetable formats) and scheduler are only imported on
+# first use, keeping worker start-up and autoscaling fast.
+def load_subsystem(name: str):
+    if __package__:
+        return importlib.import_module(f".{name}", __package__)
+    return importlib.import_module(name)
+
 # Authentication Models
 class LoginRequest(BaseModel):
     username: str
     password: str
+    school_id: Optional[str] = None
 
 class LoginResponse(BaseModel):
     access_token: str
@@ -59,8 +115,14 @@ class School(BaseModel):
     principal: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class SchoolCreateResponse(School):
+    # A session scoped to the new school, so the creator can work in it right away
+    access_token: Optional[str] = None
+    user: Optional[dict] = None
+
 class Teacher(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    school_id: Optional[str] = None
     name: str
     nip_nuptk: str
     tmt: str  # Tanggal Mulai Tugas
@@ -70,6 +132,7 @@ class Teacher(BaseModel):
 
 class Subject(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    school_id: Optional[str] = None
     code: str
     name: str
     time_allocation: int  # JP (Jam Pelajaran)
@@ -77,6 +140,7 @@ class Subject(BaseModel):
 
 class Class(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    school_id: Optional[str] = None
     level: str  # VII, VIII, IX
     group: str  # A, B, C, etc
     name: str
@@ -85,6 +149,7 @@ class Class(BaseModel):
 
 class AcademicYear(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    school_id: Optional[str] = None
     school_year: str  # 2023/2024
     semester: str  # Gasal/Genap
     curriculum: str  # Kurikulum 2013, Kurikulum Merdeka, etc
@@ -94,10 +159,110 @@ class AcademicYear(BaseModel):
 
 class AdditionalTask(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    school_id: Optional[str] = None
     name: str
     equivalent_hours: int  # JP equivalent
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class TeachingAssignment(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    school_id: Optional[str] = None
+    academic_year_id: str
+    teacher_id: str
+    subject_id: str
+    class_id: str
+    weekly_hours: int  # JP per minggu
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class TaskAssignment(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    school_id: Optional[str] = None
+    academic_year_id: str
+    teacher_id: str
+    additional_task_id: str
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ScheduleSlot(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    school_id: Optional[str] = None
+    academic_year_id: str
+    day: int  # 0 = Senin
+    slot: int  # Index into the schedule template slot table
+    class_id: str
+    teacher_id: str
+    subject_id: str
+    template_id: Optional[str] = None
+    is_locked: bool = False  # Manual entries that auto-generation must not overwrite
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ScheduleViewEntry(BaseModel):
+    id: str
+    day: int
+    slot: int
+    class_id: str
+    teacher_id: str
+    subject_id: str
+    is_locked: bool = False
+
+class ScheduleView(BaseModel):
+    school_id: Optional[str] = None
+    academic_year_id: str
+    view: str  # class, teacher, subject
+    key_id: str
+    slots: List[ScheduleViewEntry] = []
+    updated_at: Optional[datetime] = None
+
+class TemplateSlot(BaseModel):
+    slot_type: str = "belajar"  # belajar, istirahat, sholat_dhuha, upacara, literasi, etc
+    label: Optional[str] = None
+    duration: Optional[int] = Field(default=None, gt=0)  # Minutes; lessons always use the template's lesson_duration
+
+class ScheduleTemplate(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    school_id: Optional[str] = None
+    academic_year_id: str
+    name: str
+    description: Optional[str] = None
+    days_per_week: int
+    lessons_per_day: int  # JP per hari
+    lesson_duration: int  # 40/30/20 menit
+    start_time: str = "07:00"
+    slots: List[TemplateSlot] = []
+    version: int = 1
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class TemplateSlotTime(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    index: int
+    lesson_number: Optional[int] = None  # Jam ke-, only for lesson slots
+    slot_type: str
+    label: str
+    start_time: str
+    end_time: str
+    is_lesson: bool
+
+class SKTemplate(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    school_id: Optional[str] = None
+    name: str
+    sk_type: str  # individu, keseluruhan
+    content: str  # HTML with {{placeholder}} fields
+    version: int = 1
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class SKDocument(BaseModel):
+    id: str  # GridFS file id
+    filename: str
+    length: int
+    content_hash: str
+    template_id: str
+    template_version: int
+    academic_year_id: str
+    teacher_id: Optional[str] = None
+    upload_date: datetime
+    reused: bool = False  # True when an identical SK was already archived
+
 # Create Request Models
 class SchoolCreate(BaseModel):
     name: str
@@ -131,6 +296,58 @@ class AdditionalTaskCreate(BaseModel):
     name: str
     equivalent_hours: int
 
+class TeachingAssignmentCreate(BaseModel):
+    academic_year_id: str
+    teacher_id: str
+    subject_id: str
+    class_id: str
+    weekly_hours: int
+
+class TaskAssignmentCreate(BaseModel):
+    academic_year_id: str
+    teacher_id: str
+    additional_task_id: str
+
+class RolloverRequest(BaseModel):
+    source_academic_year_id: str
+    dry_run: bool = False
+
+# Bounds of the day x slot grid a schedule slot can occupy
+MAX_DAYS_PER_WEEK = 7
+MAX_SLOTS_PER_DAY = 20
+
+class ScheduleSlotCreate(BaseModel):
+    academic_year_id: str
+    day: int = Field(ge=0, le=MAX_DAYS_PER_WEEK - 1)  # 0 = Senin
+    slot: int = Field(ge=0, le=MAX_SLOTS_PER_DAY - 1)
+    class_id: str
+    teacher_id: str
+    subject_id: str
+    template_id: str  # Slot indexes only mean something relative to a template
+    is_locked: bool = False
+
+class ScheduleTemplateCreate(BaseModel):
+    academic_year_id: str
+    name: str
+    description: Optional[str] = None
+    days_per_week: int
+    lessons_per_day: int
+    lesson_duration: int
+    start_time: str = "07:00"
+    slots: List[TemplateSlot] = []
+
+class SKTemplateCreate(BaseModel):
+    name: str
+    sk_type: str
+    content: str
+
+class SKGenerateRequest(BaseModel):
+    template_id: str
+    academic_year_id: str
+    teacher_id: Optional[str] = None  # Required for SK Individu
+    place: str  # Tempat pembuatan
+    date: str  # Tanggal pembuatan
+
 # Authentication Functions
 def create_access_token(data: dict):
     return jwt.encode(data, SECRET_KEY, algorithm=ALGORITHM)
@@ -145,25 +362,64 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     except jwt.PyJWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
+async def get_school_id(token_data: dict = Depends(verify_token)):
+    # Every tenant-owned collection is scoped by the school in the token claims
+    # 401 makes the client drop the session and log in again, where it picks a school
+    school_id = token_data.get("school_id")
+    if not school_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No school selected")
+    # Tokens of a deleted school must stop working
+    if not await db.schools.find_one({"id": school_id}, {"_id": 1}):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="School no longer exists")
+    return school_id
+
+async def create_login_response(username: str, school_id: Optional[str]):
+    if school_id:
+        if not await db.schools.find_one({"id": school_id}):
+            raise HTTPException(status_code=404, detail="School not found")
+    else:
+        # A single registered school is picked automatically. With none or several
+        # the session stays unscoped and the client shows the school picker.
+        schools = await db.schools.find({}, {"id": 1}).to_list(2)
+        school_id = schools[0]["id"] if len(schools) == 1 else None
+
+    token_data = {"sub": username, "role": "admin", "school_id": school_id}
+    access_token = create_access_token(token_data)
+    
+    user_data = {
+        "id": str(uuid.uuid4()),
+        "username": "admin",
+        "name": "Administrator",
+        "role": "admin",
+        "school_id": school_id
+    }
+    
+    return LoginResponse(
+        access_token=access_token,
+        user=user_data
+    )
+
+# Health Routes
+@api_router.get("/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+@api_router.get("/health/ready")
+async def readiness():
+    if not app.state.ready:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Starting up")
+    try:
+        await asyncio.wait_for(db.command("ping"), READINESS_PING_TIMEOUT)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database unavailable")
+    return {"status": "ready"}
+
 # Authentication Routes
 @api_router.post("/auth/login", response_model=LoginResponse)
 async def login(request: LoginRequest):
     # Simple hardcoded authentication
     if request.username == "admin" and request.password == "Adifathi2020":
-        token_data = {"sub": request.username, "role": "admin"}
-        access_token = create_access_token(token_data)
-        
-        user_data = {
-            "id": str(uuid.uuid4()),
-            "username": "admin",
-            "name": "Administrator",
-            "role": "admin"
-        }
-        
-        return LoginResponse(
-            access_token=access_token,
-            user=user_data
-        )
+        return await create_login_response(request.username, request.school_id)
     else:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -175,24 +431,39 @@ async def get_current_user(token_data: dict = Depends(verify_token)):
     return {
         "username": token_data.get("sub"),
         "role": token_data.get("role"),
-        "name": "Administrator"
+        "name": "Administrator",
+        "school_id": token_data.get("school_id")
     }
 
+@api_router.post("/auth/switch-school/{school_id}", response_model=LoginResponse)
+async def switch_school(school_id: str, token_data: dict = Depends(verify_token)):
+    # Only a session without a school may pick one; moving between schools
+    # needs a fresh login with school_id.
+    current_school_id = token_data.get("school_id")
+    if current_school_id and current_school_id != school_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Session is bound to another school")
+    return await create_login_response(token_data.get("sub"), school_id)
+
 # School Routes
-@api_router.post("/schools", response_model=School)
+@api_router.post("/schools", response_model=SchoolCreateResponse)
 async def create_school(school: SchoolCreate, token_data: dict = Depends(verify_token)):
     school_dict = school.dict()
     school_obj = School(**school_dict)
     await db.schools.insert_one(school_obj.dict())
-    return school_obj
+    session = await create_login_response(token_data.get("sub"), school_obj.id)
+    return SchoolCreateResponse(**school_obj.dict(), access_token=session.access_token, user=session.user)
 
 @api_router.get("/schools", response_model=List[School])
 async def get_schools(token_data: dict = Depends(verify_token)):
-    schools = await db.schools.find().to_list(1000)
+    # A scoped session sees its own school; an unscoped one gets the list to pick from
+    school_id = token_data.get("school_id")
+    schools = await db.schools.find({"id": school_id} if school_id else {}).sort("name", 1).to_list(1000)
     return [School(**school) for school in schools]
 
 @api_router.put("/schools/{school_id}", response_model=School)
-async def update_school(school_id: str, school: SchoolCreate, token_data: dict = Depends(verify_token)):
+async def update_school(school_id: str, school: SchoolCreate, current_school_id: str = Depends(get_school_id)):
+    if school_id != current_school_id:
+        raise HTTPException(status_code=404, detail="School not found")
     school_dict = school.dict()
     await db.schools.update_one({"id": school_id}, {"$set": school_dict})
     updated_school = await db.schools.find_one({"id": school_id})
@@ -201,7 +472,15 @@ async def update_school(school_id: str, school: SchoolCreate, token_data: dict =
     return School(**updated_school)
 
 @api_router.delete("/schools/{school_id}")
-async def delete_school(school_id: str, token_data: dict = Depends(verify_token)):
+async def delete_school(school_id: str, current_school_id: str = Depends(get_school_id)):
+    if school_id != current_school_id:
+        raise HTTPException(status_code=404, detail="School not found")
+    # Refuse rather than orphan the school's data
+    for collection in list(TENANT_INDEXES) + ["schedule_views"]:
+        if await db[collection].find_one({"school_id": school_id}, {"_id": 1}):
+            raise HTTPException(status_code=409, detail="School still has data; delete it first")
+    if await db["sk_archive.files"].find_one({"metadata.school_id": school_id}, {"_id": 1}):
+        raise HTTPException(status_code=409, detail="School still has data; delete it first")
     result = await db.schools.delete_one({"id": school_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="School not found")
@@ -209,156 +488,899 @@ async def delete_school(school_id: str, token_data: dict = Depends(verify_token)
 
 # Teacher Routes
 @api_router.post("/teachers", response_model=Teacher)
-async def create_teacher(teacher: TeacherCreate, token_data: dict = Depends(verify_token)):
+async def create_teacher(teacher: TeacherCreate, school_id: str = Depends(get_school_id)):
     teacher_dict = teacher.dict()
-    teacher_obj = Teacher(**teacher_dict)
+    teacher_obj = Teacher(**teacher_dict, school_id=school_id)
     await db.teachers.insert_one(teacher_obj.dict())
     return teacher_obj
 
 @api_router.get("/teachers", response_model=List[Teacher])
-async def get_teachers(token_data: dict = Depends(verify_token)):
-    teachers = await db.teachers.find().to_list(1000)
+async def get_teachers(school_id: str = Depends(get_school_id)):
+    teachers = await db.teachers.find({"school_id": school_id}).to_list(1000)
     return [Teacher(**teacher) for teacher in teachers]
 
 @api_router.put("/teachers/{teacher_id}", response_model=Teacher)
-async def update_teacher(teacher_id: str, teacher: TeacherCreate, token_data: dict = Depends(verify_token)):
+async def update_teacher(teacher_id: str, teacher: TeacherCreate, school_id: str = Depends(get_school_id)):
     teacher_dict = teacher.dict()
-    await db.teachers.update_one({"id": teacher_id}, {"$set": teacher_dict})
-    updated_teacher = await db.teachers.find_one({"id": teacher_id})
+    await db.teachers.update_one({"id": teacher_id, "school_id": school_id}, {"$set": teacher_dict})
+    updated_teacher = await db.teachers.find_one({"id": teacher_id, "school_id": school_id})
     if not updated_teacher:
         raise HTTPException(status_code=404, detail="Teacher not found")
     return Teacher(**updated_teacher)
 
 @api_router.delete("/teachers/{teacher_id}")
-async def delete_teacher(teacher_id: str, token_data: dict = Depends(verify_token)):
-    result = await db.teachers.delete_one({"id": teacher_id})
+async def delete_teacher(teacher_id: str, school_id: str = Depends(get_school_id)):
+    result = await db.teachers.delete_one({"id": teacher_id, "school_id": school_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Teacher not found")
     return {"message": "Teacher deleted successfully"}
 
 # Subject Routes
 @api_router.post("/subjects", response_model=Subject)
-async def create_subject(subject: SubjectCreate, token_data: dict = Depends(verify_token)):
+async def create_subject(subject: SubjectCreate, school_id: str = Depends(get_school_id)):
     subject_dict = subject.dict()
-    subject_obj = Subject(**subject_dict)
+    subject_obj = Subject(**subject_dict, school_id=school_id)
     await db.subjects.insert_one(subject_obj.dict())
     return subject_obj
 
 @api_router.get("/subjects", response_model=List[Subject])
-async def get_subjects(token_data: dict = Depends(verify_token)):
-    subjects = await db.subjects.find().to_list(1000)
+async def get_subjects(school_id: str = Depends(get_school_id)):
+    subjects = await db.subjects.find({"school_id": school_id}).to_list(1000)
     return [Subject(**subject) for subject in subjects]
 
 @api_router.put("/subjects/{subject_id}", response_model=Subject)
-async def update_subject(subject_id: str, subject: SubjectCreate, token_data: dict = Depends(verify_token)):
+async def update_subject(subject_id: str, subject: SubjectCreate, school_id: str = Depends(get_school_id)):
     subject_dict = subject.dict()
-    await db.subjects.update_one({"id": subject_id}, {"$set": subject_dict})
-    updated_subject = await db.subjects.find_one({"id": subject_id})
+    await db.subjects.update_one({"id": subject_id, "school_id": school_id}, {"$set": subject_dict})
+    updated_subject = await db.subjects.find_one({"id": subject_id, "school_id": school_id})
     if not updated_subject:
         raise HTTPException(status_code=404, detail="Subject not found")
     return Subject(**updated_subject)
 
 @api_router.delete("/subjects/{subject_id}")
-async def delete_subject(subject_id: str, token_data: dict = Depends(verify_token)):
-    result = await db.subjects.delete_one({"id": subject_id})
+async def delete_subject(subject_id: str, school_id: str = Depends(get_school_id)):
+    result = await db.subjects.delete_one({"id": subject_id, "school_id": school_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Subject not found")
     return {"message": "Subject deleted successfully"}
 
 # Class Routes
 @api_router.post("/classes", response_model=Class)
-async def create_class(class_data: ClassCreate, token_data: dict = Depends(verify_token)):
+async def create_class(class_data: ClassCreate, school_id: str = Depends(get_school_id)):
     class_dict = class_data.dict()
-    class_obj = Class(**class_dict)
+    class_obj = Class(**class_dict, school_id=school_id)
     await db.classes.insert_one(class_obj.dict())
     return class_obj
 
 @api_router.get("/classes", response_model=List[Class])
-async def get_classes(token_data: dict = Depends(verify_token)):
-    classes = await db.classes.find().to_list(1000)
+async def get_classes(school_id: str = Depends(get_school_id)):
+    classes = await db.classes.find({"school_id": school_id}).to_list(1000)
     return [Class(**class_data) for class_data in classes]
 
 @api_router.put("/classes/{class_id}", response_model=Class)
-async def update_class(class_id: str, class_data: ClassCreate, token_data: dict = Depends(verify_token)):
+async def update_class(class_id: str, class_data: ClassCreate, school_id: str = Depends(get_school_id)):
     class_dict = class_data.dict()
-    await db.classes.update_one({"id": class_id}, {"$set": class_dict})
-    updated_class = await db.classes.find_one({"id": class_id})
+    await db.classes.update_one({"id": class_id, "school_id": school_id}, {"$set": class_dict})
+    updated_class = await db.classes.find_one({"id": class_id, "school_id": school_id})
     if not updated_class:
         raise HTTPException(status_code=404, detail="Class not found")
     return Class(**updated_class)
 
 @api_router.delete("/classes/{class_id}")
-async def delete_class(class_id: str, token_data: dict = Depends(verify_token)):
-    result = await db.classes.delete_one({"id": class_id})
+async def delete_class(class_id: str, school_id: str = Depends(get_school_id)):
+    result = await db.classes.delete_one({"id": class_id, "school_id": school_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Class not found")
     return {"message": "Class deleted successfully"}
 
 # Academic Year Routes
 @api_router.post("/academic-years", response_model=AcademicYear)
-async def create_academic_year(academic_year: AcademicYearCreate, token_data: dict = Depends(verify_token)):
+async def create_academic_year(academic_year: AcademicYearCreate, school_id: str = Depends(get_school_id)):
     academic_year_dict = academic_year.dict()
-    academic_year_obj = AcademicYear(**academic_year_dict)
+    academic_year_obj = AcademicYear(**academic_year_dict, school_id=school_id)
     await db.academic_years.insert_one(academic_year_obj.dict())
     return academic_year_obj
 
 @api_router.get("/academic-years", response_model=List[AcademicYear])
-async def get_academic_years(token_data: dict = Depends(verify_token)):
-    academic_years = await db.academic_years.find().to_list(1000)
+async def get_academic_years(school_id: str = Depends(get_school_id)):
+    academic_years = await db.academic_years.find({"school_id": school_id}).to_list(1000)
     return [AcademicYear(**academic_year) for academic_year in academic_years]
 
 @api_router.put("/academic-years/{academic_year_id}", response_model=AcademicYear)
-async def update_academic_year(academic_year_id: str, academic_year: AcademicYearCreate, token_data: dict = Depends(verify_token)):
+async def update_academic_year(academic_year_id: str, academic_year: AcademicYearCreate, school_id: str = Depends(get_school_id)):
     academic_year_dict = academic_year.dict()
-    await db.academic_years.update_one({"id": academic_year_id}, {"$set": academic_year_dict})
-    updated_academic_year = await db.academic_years.find_one({"id": academic_year_id})
+    await db.academic_years.update_one({"id": academic_year_id, "school_id": school_id}, {"$set": academic_year_dict})
+    updated_academic_year = await db.academic_years.find_one({"id": academic_year_id, "school_id": school_id})
     if not updated_academic_year:
         raise HTTPException(status_code=404, detail="Academic Year not found")
     return AcademicYear(**updated_academic_year)
 
 @api_router.delete("/academic-years/{academic_year_id}")
-async def delete_academic_year(academic_year_id: str, token_data: dict = Depends(verify_token)):
-    result = await db.academic_years.delete_one({"id": academic_year_id})
+async def delete_academic_year(academic_year_id: str, school_id: str = Depends(get_school_id)):
+    result = await db.academic_years.delete_one({"id": academic_year_id, "school_id": school_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Academic Year not found")
     return {"message": "Academic Year deleted successfully"}
 
 # Additional Task Routes
 @api_router.post("/additional-tasks", response_model=AdditionalTask)
-async def create_additional_task(task: AdditionalTaskCreate, token_data: dict = Depends(verify_token)):
+async def create_additional_task(task: AdditionalTaskCreate, school_id: str = Depends(get_school_id)):
     task_dict = task.dict()
-    task_obj = AdditionalTask(**task_dict)
+    task_obj = AdditionalTask(**task_dict, school_id=school_id)
     await db.additional_tasks.insert_one(task_obj.dict())
     return task_obj
 
 @api_router.get("/additional-tasks", response_model=List[AdditionalTask])
-async def get_additional_tasks(token_data: dict = Depends(verify_token)):
-    tasks = await db.additional_tasks.find().to_list(1000)
+async def get_additional_tasks(school_id: str = Depends(get_school_id)):
+    tasks = await db.additional_tasks.find({"school_id": school_id}).to_list(1000)
     return [AdditionalTask(**task) for task in tasks]
 
 @api_router.put("/additional-tasks/{task_id}", response_model=AdditionalTask)
-async def update_additional_task(task_id: str, task: AdditionalTaskCreate, token_data: dict = Depends(verify_token)):
+async def update_additional_task(task_id: str, task: AdditionalTaskCreate, school_id: str = Depends(get_school_id)):
     task_dict = task.dict()
-    await db.additional_tasks.update_one({"id": task_id}, {"$set": task_dict})
-    updated_task = await db.additional_tasks.find_one({"id": task_id})
+    await db.additional_tasks.update_one({"id": task_id, "school_id": school_id}, {"$set": task_dict})
+    updated_task = await db.additional_tasks.find_one({"id": task_id, "school_id": school_id})
     if not updated_task:
         raise HTTPException(status_code=404, detail="Additional Task not found")
     return AdditionalTask(**updated_task)
 
 @api_router.delete("/additional-tasks/{task_id}")
-async def delete_additional_task(task_id: str, token_data: dict = Depends(verify_token)):
-    result = await db.additional_tasks.delete_one({"id": task_id})
+async def delete_additional_task(task_id: str, school_id: str = Depends(get_school_id)):
+    result = await db.additional_tasks.delete_one({"id": task_id, "school_id": school_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Additional Task not found")
     return {"message": "Additional Task deleted successfully"}
 
+# Teaching Assignment Routes (Pembagian JTM)
+@api_router.post("/teaching-assignments", response_model=TeachingAssignment)
+async def create_teaching_assignment(assignment: TeachingAssignmentCreate, school_id: str = Depends(get_school_id)):
+    assignment_dict = assignment.dict()
+    assignment_obj = TeachingAssignment(**assignment_dict, school_id=school_id)
+    await db.teaching_assignments.insert_one(assignment_obj.dict())
+    return assignment_obj
+
+@api_router.get("/teaching-assignments", response_model=List[TeachingAssignment])
+async def get_teaching_assignments(academic_year_id: Optional[str] = None, school_id: str = Depends(get_school_id)):
+    query = {"school_id": school_id}
+    if academic_year_id:
+        query["academic_year_id"] = academic_year_id
+    assignments = await db.teaching_assignments.find(query).to_list(None)
+    return [TeachingAssignment(**assignment) for assignment in assignments]
+
+@api_router.put("/teaching-assignments/{assignment_id}", response_model=TeachingAssignment)
+async def update_teaching_assignment(assignment_id: str, assignment: TeachingAssignmentCreate, school_id: str = Depends(get_school_id)):
+    assignment_dict = assignment.dict()
+    await db.teaching_assignments.update_one({"id": assignment_id, "school_id": school_id}, {"$set": assignment_dict})
+    updated_assignment = await db.teaching_assignments.find_one({"id": assignment_id, "school_id": school_id})
+    if not updated_assignment:
+        raise HTTPException(status_code=404, detail="Teaching Assignment not found")
+    return TeachingAssignment(**updated_assignment)
+
+@api_router.delete("/teaching-assignments/{assignment_id}")
+async def delete_teaching_assignment(assignment_id: str, school_id: str = Depends(get_school_id)):
+    result = await db.teaching_assignments.delete_one({"id": assignment_id, "school_id": school_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Teaching Assignment not found")
+    return {"message": "Teaching Assignment deleted successfully"}
+
+# Task Assignment Routes (Pembagian TTG)
+@api_router.post("/task-assignments", response_model=TaskAssignment)
+async def create_task_assignment(assignment: TaskAssignmentCreate, school_id: str = Depends(get_school_id)):
+    assignment_dict = assignment.dict()
+    assignment_obj = TaskAssignment(**assignment_dict, school_id=school_id)
+    await db.task_assignments.insert_one(assignment_obj.dict())
+    return assignment_obj
+
+@api_router.get("/task-assignments", response_model=List[TaskAssignment])
+async def get_task_assignments(academic_year_id: Optional[str] = None, school_id: str = Depends(get_school_id)):
+    query = {"school_id": school_id}
+    if academic_year_id:
+        query["academic_year_id"] = academic_year_id
+    assignments = await db.task_assignments.find(query).to_list(None)
+    return [TaskAssignment(**assignment) for assignment in assignments]
+
+@api_router.put("/task-assignments/{assignment_id}", response_model=TaskAssignment)
+async def update_task_assignment(assignment_id: str, assignment: TaskAssignmentCreate, school_id: str = Depends(get_school_id)):
+    assignment_dict = assignment.dict()
+    await db.task_assignments.update_one({"id": assignment_id, "school_id": school_id}, {"$set": assignment_dict})
+    updated_assignment = await db.task_assignments.find_one({"id": assignment_id, "school_id": school_id})
+    if not updated_assignment:
+        raise HTTPException(status_code=404, detail="Task Assignment not found")
+    return TaskAssignment(**updated_assignment)
+
+@api_router.delete("/task-assignments/{assignment_id}")
+async def delete_task_assignment(assignment_id: str, school_id: str = Depends(get_school_id)):
+    result = await db.task_assignments.delete_one({"id": assignment_id, "school_id": school_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Task Assignment not found")
+    return {"message": "Task Assignment deleted successfully"}
+
+# Academic Year Rollover
+# Natural keys of the year-scoped collections that are copied into a new
+# academic year. Each has a unique index on (school_id, academic_year_id, *keys), which
+# $merge uses to skip rows that already exist in the target year.
+ROLLOVER_COLLECTIONS = {
+    "teaching_assignments": ["teacher_id", "subject_id", "class_id"],
+    "task_assignments": ["teacher_id", "additional_task_id"],
+    "schedule_templates": ["name"]
+}
+
+def rollover_diff_pipeline(keys: List[str], school_id: str, source_id: str, target_id: str, collection: str):
+    return [
+        {"$match": {"school_id": school_id, "academic_year_id": source_id}},
+        {"$lookup": {
+            "from": collection,
+            "let": {key: "$" + key for key in keys},
+            "pipeline": [
+                {"$match": {
+                    "school_id": school_id,
+                    "academic_year_id": target_id,
+                    "$expr": {"$and": [{"$eq": ["$" + key, "$$" + key]} for key in keys]}
+                }},
+                {"$limit": 1},
+                {"$project": {"_id": 1}}
+            ],
+            "as": "existing"
+        }},
+        {"$group": {
+            "_id": None,
+            "source": {"$sum": 1},
+            "insert": {"$sum": {"$cond": [{"$eq": [{"$size": "$existing"}, 0]}, 1, 0]}}
+        }}
+    ]
+
+def rollover_merge_pipeline(keys: List[str], school_id: str, source_id: str, target_id: str, collection: str):
+    return [
+        {"$match": {"school_id": school_id, "academic_year_id": source_id}},
+        {"$set": {
+            "academic_year_id": target_id,
+            # New ids are derived from the source document, so re-running is idempotent
+            "id": {"$concat": [target_id, ":", {"$toString": "$_id"}]},
+            "created_at": "$$NOW"
+        }},
+        {"$unset": "_id"},
+        {"$merge": {
+            "into": collection,
+            "on": ["school_id", "academic_year_id"] + keys,
+            "whenMatched": "keepExisting",
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+@api_router.post("/academic-years/{academic_year_id}/rollover")
+async def rollover_academic_year(academic_year_id: str, request: RolloverRequest, school_id: str = Depends(get_school_id)):
+    source_id = request.source_academic_year_id
+    if source_id == academic_year_id:
+        raise HTTPException(status_code=400, detail="Source and target academic year must differ")
+    years = await db.academic_years.count_documents(
+        {"school_id": school_id, "id": {"$in": [source_id, academic_year_id]}}
+    )
+    if years != 2:
+        raise HTTPException(status_code=404, detail="Academic Year not found")
+
+    diff = {}
+    for collection, keys in ROLLOVER_COLLECTIONS.items():
+        result = await db[collection].aggregate(
+            rollover_diff_pipeline(keys, school_id, source_id, academic_year_id, collection)
+        ).to_list(1)
+        counts = result[0] if result else {"source": 0, "insert": 0}
+        diff[collection] = {
+            "source": counts["source"],
+            "insert": counts["insert"],
+            "existing": counts["source"] - counts["insert"]
+        }
+        if not request.dry_run and counts["insert"]:
+            await db[collection].aggregate(
+                rollover_merge_pipeline(keys, school_id, source_id, academic_year_id, collection)
+            ).to_list(None)
+
+    return {"dry_run": request.dry_run, "collections": diff}
+
+# Schedule Templates
+SLOT_TYPES = [
+    "belajar", "istirahat", "sholat_dhuha", "sholat_dzuhur", "upacara",
+    "halaqoh_quran", "literasi", "pembiasaan"
+]
+LESSON_DURATIONS = [40, 30, 20]
+
+# Expanded slot tables keyed by template id, holding (version, table). Tables
+# are immutable, so the scheduler, clash checker and exporters can share them.
+slot_table_cache = {}
+
+def expand_slot_table(template: dict):
+    # The scheduler computes the rows; TemplateSlotTime is their only schema
+    rows = load_subsystem("scheduler").expand_schedule_template(template)
+    return tuple(TemplateSlotTime(**row) for row in rows)
+
+def validate_schedule_template(template: ScheduleTemplateCreate):
+    if template.lesson_duration not in LESSON_DURATIONS:
+        raise HTTPException(status_code=400, detail="Lesson duration must be 40, 30 or 20 minutes")
+    if not 1 <= template.days_per_week <= MAX_DAYS_PER_WEEK or not 1 <= template.lessons_per_day <= MAX_SLOTS_PER_DAY:
+        raise HTTPException(status_code=400, detail="Invalid days per week or lessons per day")
+    if len(template.slots) > MAX_SLOTS_PER_DAY:
+        raise HTTPException(status_code=400, detail=f"A template can have at most {MAX_SLOTS_PER_DAY} slots per day")
+    for slot in template.slots:
+        if slot.slot_type not in SLOT_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unknown slot type: {slot.slot_type}")
+        if slot.slot_type != "belajar" and not slot.duration:
+            raise HTTPException(status_code=400, detail="Non-lesson slots need a duration")
+    if template.slots:
+        lessons = sum(1 for slot in template.slots if slot.slot_type == "belajar")
+        if lessons != template.lessons_per_day:
+            raise HTTPException(status_code=400, detail="Lesson slots do not match lessons per day")
+    try:
+        # Expanding checks the clock: valid HH:MM, positive durations, ends before midnight
+        return expand_slot_table(template.dict())
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+async def check_template_edit(template_id: str, template: ScheduleTemplateCreate, table: tuple, school_id: str):
+    # Schedule slots store a position in the slot table. An edit may move clock
+    # times, but every occupied position must stay the same lesson (Jam ke-).
+    current = await db.schedule_templates.find_one({"id": template_id, "school_id": school_id}, {"_id": 0})
+    if not current:
+        raise HTTPException(status_code=404, detail="Schedule template not found")
+    used = await db.schedule_slots.aggregate([
+        {"$match": {"school_id": school_id, "template_id": template_id}},
+        {"$group": {"_id": {"day": "$day", "slot": "$slot"}}}
+    ]).to_list(None)
+    if not used:
+        return
+    if template.academic_year_id != current["academic_year_id"]:
+        raise HTTPException(status_code=409, detail="Template is in use; its academic year cannot change")
+    current_table = get_slot_table(current)
+    for cell in used:
+        day, index = cell["_id"]["day"], cell["_id"]["slot"]
+        if (
+            day >= template.days_per_week
+            or index >= len(table)
+            or not table[index].is_lesson
+            or index >= len(current_table)
+            or table[index].lesson_number != current_table[index].lesson_number
+        ):
+            raise HTTPException(
+                status_code=409,
+                detail="Template change would move or drop lessons that are already scheduled"
+            )
+
+def get_slot_table(template: dict):
+    cached = slot_table_cache.get(template["id"])
+    if cached and cached[0] == template["version"]:
+        return cached[1]
+    table = expand_slot_table(template)
+    slot_table_cache[template["id"]] = (template["version"], table)
+    return table
+
+async def load_slot_table(template_id: str, school_id: str):
+    template = await db.schedule_templates.find_one({"id": template_id, "school_id": school_id}, {"_id": 0})
+    if not template:
+        raise HTTPException(status_code=404, detail="Schedule template not found")
+    return template, get_slot_table(template)
+
+# Schedule Template Routes
+@api_router.post("/schedule-templates", response_model=ScheduleTemplate)
+async def create_schedule_template(template: ScheduleTemplateCreate, school_id: str = Depends(get_school_id)):
+    validate_schedule_template(template)
+    template_dict = template.dict()
+    template_obj = ScheduleTemplate(**template_dict, school_id=school_id)
+    await db.schedule_templates.insert_one(template_obj.dict())
+    return template_obj
+
+@api_router.get("/schedule-templates", response_model=List[ScheduleTemplate])
+async def get_schedule_templates(academic_year_id: Optional[str] = None, school_id: str = Depends(get_school_id)):
+    query = {"school_id": school_id}
+    if academic_year_id:
+        query["academic_year_id"] = academic_year_id
+    templates = await db.schedule_templates.find(query).to_list(1000)
+    return [ScheduleTemplate(**template) for template in templates]
+
+@api_router.put("/schedule-templates/{template_id}", response_model=ScheduleTemplate)
+async def update_schedule_template(template_id: str, template: ScheduleTemplateCreate, school_id: str = Depends(get_school_id)):
+    table = validate_schedule_template(template)
+    await check_template_edit(template_id, template, table, school_id)
+    template_dict = template.dict()
+    # Bumping the version invalidates every cached slot table for this template
+    await db.schedule_templates.update_one({"id": template_id, "school_id": school_id}, {"$set": template_dict, "$inc": {"version": 1}})
+    updated_template = await db.schedule_templates.find_one({"id": template_id, "school_id": school_id})
+    if not updated_template:
+        raise HTTPException(status_code=404, detail="Schedule template not found")
+    return ScheduleTemplate(**updated_template)
+
+@api_router.delete("/schedule-templates/{template_id}")
+async def delete_schedule_template(template_id: str, school_id: str = Depends(get_school_id)):
+    if await db.schedule_slots.find_one({"school_id": school_id, "template_id": template_id}):
+        raise HTTPException(status_code=409, detail="Schedule template is used by schedule slots")
+    result = await db.schedule_templates.delete_one({"id": template_id, "school_id": school_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Schedule template not found")
+    slot_table_cache.pop(template_id, None)
+    return {"message": "Schedule template deleted successfully"}
+
+@api_router.get("/schedule-templates/{template_id}/slot-table", response_model=List[TemplateSlotTime])
+async def get_schedule_template_slot_table(template_id: str, school_id: str = Depends(get_school_id)):
+    template, table = await load_slot_table(template_id, school_id)
+    return list(table)
+
+# Schedule Projections
+# Every slot is mirrored into one document per class, teacher and subject in
+# `schedule_views`, so each printed/displayed view is a single find_one.
+SCHEDULE_VIEWS = {"class": "class_id", "teacher": "teacher_id", "subject": "subject_id"}
+SCHEDULE_VIEW_FIELDS = ["id", "day", "slot", "class_id", "teacher_id", "subject_id", "is_locked"]
+
+def schedule_view_filter(slot: dict, view: str):
+    return {
+        "school_id": slot["school_id"],
+        "academic_year_id": slot["academic_year_id"],
+        "view": view,
+        "key_id": slot[SCHEDULE_VIEWS[view]]
+    }
+
+async def add_slot_to_views(slot: dict):
+    entry = {field: slot[field] for field in SCHEDULE_VIEW_FIELDS}
+    now = datetime.now(timezone.utc)
+    await db.schedule_views.bulk_write([
+        UpdateOne(
+            schedule_view_filter(slot, view),
+            {
+                "$push": {"slots": {"$each": [entry], "$sort": {"day": 1, "slot": 1}}},
+                "$set": {"updated_at": now}
+            },
+            upsert=True
+        )
+        for view in SCHEDULE_VIEWS
+    ], ordered=False)
+
+async def remove_slot_from_views(slot: dict):
+    now = datetime.now(timezone.utc)
+    await db.schedule_views.bulk_write([
+        UpdateOne(
+            schedule_view_filter(slot, view),
+            {"$pull": {"slots": {"id": slot["id"]}}, "$set": {"updated_at": now}}
+        )
+        for view in SCHEDULE_VIEWS
+    ], ordered=False)
+
+def replace_slot_in_view(slot: dict, view: str, now: datetime):
+    # One pipeline update swaps the entry atomically, so the view is never
+    # seen without the slot while it is being edited. The slots array is kept
+    # sorted, so the entry goes in between the ones before and after its
+    # (day, slot); this sticks to MongoDB 4.2 operators ($sortArray is 5.2+).
+    entry = {field: slot[field] for field in SCHEDULE_VIEW_FIELDS}
+    comes_before = {"$or": [
+        {"$lt": ["$$this.day", slot["day"]]},
+        {"$and": [{"$eq": ["$$this.day", slot["day"]]}, {"$lte": ["$$this.slot", slot["slot"]]}]}
+    ]}
+    return UpdateOne(
+        schedule_view_filter(slot, view),
+        [{"$set": {
+            "slots": {"$let": {
+                "vars": {"others": {"$filter": {
+                    "input": {"$ifNull": ["$slots", []]},
+                    "cond": {"$ne": ["$$this.id", slot["id"]]}
+                }}},
+                "in": {"$concatArrays": [
+                    {"$filter": {"input": "$$others", "cond": comes_before}},
+                    [{"$literal": entry}],
+                    {"$filter": {"input": "$$others", "cond": {"$not": [comes_before]}}}
+                ]}
+            }},
+            "updated_at": now
+        }}],
+        upsert=True
+    )
+
+async def move_slot_in_views(old_slot: dict, slot: dict):
+    now = datetime.now(timezone.utc)
+    operations = []
+    for view in SCHEDULE_VIEWS:
+        if schedule_view_filter(old_slot, view) == schedule_view_filter(slot, view):
+            operations.append(replace_slot_in_view(slot, view, now))
+        else:
+            operations.append(UpdateOne(
+                schedule_view_filter(old_slot, view),
+                {"$pull": {"slots": {"id": old_slot["id"]}}, "$set": {"updated_at": now}}
+            ))
+            operations.append(UpdateOne(
+                schedule_view_filter(slot, view),
+                {
+                    "$push": {"slots": {"$each": [{field: slot[field] for field in SCHEDULE_VIEW_FIELDS}], "$sort": {"day": 1, "slot": 1}}},
+                    "$set": {"updated_at": now}
+                },
+                upsert=True
+            ))
+    await db.schedule_views.bulk_write(operations, ordered=False)
+
+async def rebuild_schedule_views(school_id: str, academic_year_id: str):
+    # Replace the views in place first and only then drop the ones no slot
+    # points at any more, so displays never see a missing or empty view.
+    # Mongo stores milliseconds, so truncate to keep the comparison exact.
+    # A slot edit that lands while the rebuild runs stamps its views with a
+    # later updated_at; the merge keeps those instead of overwriting them
+    # with its older snapshot, and the cleanup below leaves them alone.
+    now = datetime.now(timezone.utc)
+    rebuild_started = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    for view, field in SCHEDULE_VIEWS.items():
+        pipeline = [
+            {"$match": {"school_id": school_id, "academic_year_id": academic_year_id}},
+            {"$sort": {"day": 1, "slot": 1}},
+            {"$group": {
+                "_id": "$" + field,
+                "slots": {"$push": {name: "$" + name for name in SCHEDULE_VIEW_FIELDS}}
+            }},
+            {"$project": {
+                "_id": 0,
+                "school_id": {"$literal": school_id},
+                "academic_year_id": {"$literal": academic_year_id},
+                "view": {"$literal": view},
+                "key_id": "$_id",
+                "slots": 1,
+                "updated_at": {"$literal": rebuild_started}
+            }},
+            {"$merge": {
+                "into": "schedule_views",
+                "on": ["school_id", "academic_year_id", "view", "key_id"],
+                "whenMatched": [{"$replaceWith": {"$cond": [
+                    {"$gt": ["$updated_at", "$$new.updated_at"]}, "$$ROOT", "$$new"
+                ]}}],
+                "whenNotMatched": "insert"
+            }}
+        ]
+        await db.schedule_slots.aggregate(pipeline).to_list(None)
+    await db.schedule_views.delete_many({
+        "school_id": school_id,
+        "academic_year_id": academic_year_id,
+        "updated_at": {"$lt": rebuild_started}
+    })
+
+def encode_columnar_response(slots: List[dict]):
+    try:
+        encoded = load_subsystem("exports").encode_schedule_columnar(slots, MAX_DAYS_PER_WEEK, MAX_SLOTS_PER_DAY)
+    except ValueError as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    return JSONResponse(encoded)
+
+def check_schedule_format(format: str):
+    if format not in ("row", "columnar"):
+        raise HTTPException(status_code=400, detail="Unsupported schedule format")
+
+async def check_schedule_slot(slot: dict, school_id: str, slot_id: Optional[str] = None):
+    template, table = await load_slot_table(slot["template_id"], school_id)
+    if template["academic_year_id"] != slot["academic_year_id"]:
+        raise HTTPException(status_code=400, detail="Schedule template belongs to another academic year")
+    if not 0 <= slot["day"] < template["days_per_week"]:
+        raise HTTPException(status_code=400, detail="Day is outside the schedule template")
+    if not 0 <= slot["slot"] < len(table) or not table[slot["slot"]].is_lesson:
+        raise HTTPException(status_code=400, detail="Slot is not a lesson slot in the schedule template")
+    # Slot indexes of different templates are not comparable, so one year uses one template
+    other = await db.schedule_slots.find_one({
+        "school_id": school_id,
+        "academic_year_id": slot["academic_year_id"],
+        "template_id": {"$ne": slot["template_id"]},
+        "id": {"$ne": slot_id}
+    })
+    if other:
+        raise HTTPException(status_code=409, detail="Academic year is already scheduled with another template")
+    clash = await db.schedule_slots.find_one({
+        "school_id": school_id,
+        "academic_year_id": slot["academic_year_id"],
+        "day": slot["day"],
+        "slot": slot["slot"],
+        "$or": [{"class_id": slot["class_id"]}, {"teacher_id": slot["teacher_id"]}],
+        "id": {"$ne": slot_id}
+    })
+    if clash:
+        raise HTTPException(status_code=409, detail="Schedule slot clashes with an existing class or teacher slot")
+
+# Schedule Routes
+@api_router.post("/schedules", response_model=ScheduleSlot)
+async def create_schedule_slot(slot: ScheduleSlotCreate, school_id: str = Depends(get_school_id)):
+    slot_dict = slot.dict()
+    await check_schedule_slot(slot_dict, school_id)
+    slot_obj = ScheduleSlot(**slot_dict, school_id=school_id)
+    await db.schedule_slots.insert_one(slot_obj.dict())
+    await add_slot_to_views(slot_obj.dict())
+    return slot_obj
+
+@api_router.get("/schedules", response_model=List[ScheduleSlot])
+async def get_schedule_slots(academic_year_id: str, format: str = "row", school_id: str = Depends(get_school_id)):
+    check_schedule_format(format)
+    slots = await db.schedule_slots.find(
+        {"school_id": school_id, "academic_year_id": academic_year_id}, {"_id": 0}
+    ).to_list(None)
+    if format == "columnar":
+        return encode_columnar_response(slots)
+    return [ScheduleSlot(**slot) for slot in slots]
+
+@api_router.put("/schedules/{slot_id}", response_model=ScheduleSlot)
+async def update_schedule_slot(slot_id: str, slot: ScheduleSlotCreate, school_id: str = Depends(get_school_id)):
+    old_slot = await db.schedule_slots.find_one({"id": slot_id, "school_id": school_id})
+    if not old_slot:
+        raise HTTPException(status_code=404, detail="Schedule slot not found")
+    slot_dict = slot.dict()
+    await check_schedule_slot(slot_dict, school_id, slot_id)
+    await db.schedule_slots.update_one({"id": slot_id, "school_id": school_id}, {"$set": slot_dict})
+    updated_slot = await db.schedule_slots.find_one({"id": slot_id, "school_id": school_id})
+    await move_slot_in_views(old_slot, updated_slot)
+    return ScheduleSlot(**updated_slot)
+
+@api_router.delete("/schedules/{slot_id}")
+async def delete_schedule_slot(slot_id: str, school_id: str = Depends(get_school_id)):
+    old_slot = await db.schedule_slots.find_one_and_delete({"id": slot_id, "school_id": school_id})
+    if not old_slot:
+        raise HTTPException(status_code=404, detail="Schedule slot not found")
+    await remove_slot_from_views(old_slot)
+    return {"message": "Schedule slot deleted successfully"}
+
+@api_router.get("/schedules/views/{view}/{key_id}", response_model=ScheduleView)
+async def get_schedule_view(view: str, key_id: str, academic_year_id: str, format: str = "row", school_id: str = Depends(get_school_id)):
+    if view not in SCHEDULE_VIEWS:
+        raise HTTPException(status_code=404, detail="Schedule view not found")
+    check_schedule_format(format)
+    schedule_view = await db.schedule_views.find_one(
+        {"school_id": school_id, "academic_year_id": academic_year_id, "view": view, "key_id": key_id}
+    )
+    if format == "columnar":
+        slots = schedule_view["slots"] if schedule_view else []
+        return encode_columnar_response(slots)
+    if not schedule_view:
+        return ScheduleView(school_id=school_id, academic_year_id=academic_year_id, view=view, key_id=key_id)
+    return ScheduleView(**schedule_view)
+
+@api_router.post("/schedules/views/rebuild")
+async def rebuild_schedule_views_route(academic_year_id: str, school_id: str = Depends(get_school_id)):
+    await rebuild_schedule_views(school_id, academic_year_id)
+    return {"message": "Schedule views rebuilt successfully"}
+
+# SK Template Routes
+SK_TYPES = ["individu", "keseluruhan"]
+
+@api_router.post("/sk-templates", response_model=SKTemplate)
+async def create_sk_template(template: SKTemplateCreate, school_id: str = Depends(get_school_id)):
+    if template.sk_type not in SK_TYPES:
+        raise HTTPException(status_code=400, detail="SK type must be individu or keseluruhan")
+    template_dict = template.dict()
+    template_obj = SKTemplate(**template_dict, school_id=school_id)
+    await db.sk_templates.insert_one(template_obj.dict())
+    return template_obj
+
+@api_router.get("/sk-templates", response_model=List[SKTemplate])
+async def get_sk_templates(school_id: str = Depends(get_school_id)):
+    templates = await db.sk_templates.find({"school_id": school_id}).to_list(1000)
+    return [SKTemplate(**template) for template in templates]
+
+@api_router.put("/sk-templates/{template_id}", response_model=SKTemplate)
+async def update_sk_template(template_id: str, template: SKTemplateCreate, school_id: str = Depends(get_school_id)):
+    if template.sk_type not in SK_TYPES:
+        raise HTTPException(status_code=400, detail="SK type must be individu or keseluruhan")
+    template_dict = template.dict()
+    # A new version changes the content hash, so archived SKs are never reused across edits
+    await db.sk_templates.update_one({"id": template_id, "school_id": school_id}, {"$set": template_dict, "$inc": {"version": 1}})
+    updated_template = await db.sk_templates.find_one({"id": template_id, "school_id": school_id})
+    if not updated_template:
+        raise HTTPException(status_code=404, detail="SK template not found")
+    return SKTemplate(**updated_template)
+
+@api_router.delete("/sk-templates/{template_id}")
+async def delete_sk_template(template_id: str, school_id: str = Depends(get_school_id)):
+    result = await db.sk_templates.delete_one({"id": template_id, "school_id": school_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="SK template not found")
+    return {"message": "SK template deleted successfully"}
+
+# SK Archive
+# Generated SKs live in the `sk_archive` GridFS bucket, keyed by a hash of the
+# template version and the input data. Regenerating an unchanged SK returns the
+# archived file without rendering it again.
+def sk_bucket():
+    return AsyncIOMotorGridFSBucket(db, bucket_name="sk_archive")
+
+async def collect_sk_data(request: SKGenerateRequest, sk_type: str, school_id: str):
+    school = await db.schools.find_one({"id": school_id}, {"_id": 0, "name": 1, "npsn": 1, "address": 1, "principal": 1})
+    academic_year = await db.academic_years.find_one(
+        {"id": request.academic_year_id, "school_id": school_id},
+        {"_id": 0, "school_year": 1, "semester": 1, "curriculum": 1}
+    )
+    if not school or not academic_year:
+        raise HTTPException(status_code=404, detail="School or Academic Year not found")
+
+    teacher_query = {"school_id": school_id}
+    if sk_type == "individu":
+        if not request.teacher_id:
+            raise HTTPException(status_code=400, detail="SK Individu needs a teacher")
+        teacher_query["id"] = request.teacher_id
+    # Every ordering below is total, so identical data always hashes to the same SK
+    teachers = await db.teachers.find(teacher_query, {"_id": 0, "id": 1, "name": 1, "nip_nuptk": 1}).sort([("name", 1), ("id", 1)]).to_list(None)
+    if sk_type == "individu" and not teachers:
+        raise HTTPException(status_code=404, detail="Teacher not found")
+
+    year_query = {"school_id": school_id, "academic_year_id": request.academic_year_id}
+    subjects = {s["id"]: s["name"] for s in await db.subjects.find({"school_id": school_id}, {"id": 1, "name": 1}).to_list(None)}
+    classes = {c["id"]: c["name"] for c in await db.classes.find({"school_id": school_id}, {"id": 1, "name": 1}).to_list(None)}
+    tasks = {
+        t["id"]: (t["name"], t["equivalent_hours"])
+        for t in await db.additional_tasks.find({"school_id": school_id}, {"id": 1, "name": 1, "equivalent_hours": 1}).to_list(None)
+    }
+    teaching = await db.teaching_assignments.find(year_query, {"_id": 0}).to_list(None)
+    task_assignments = await db.task_assignments.find(year_query, {"_id": 0}).to_list(None)
+
+    for teacher in teachers:
+        teacher["teaching"] = sorted(
+            [
+                {"subject": subjects.get(a["subject_id"], "-"), "class": classes.get(a["class_id"], "-"), "hours": a["weekly_hours"]}
+                for a in teaching if a["teacher_id"] == teacher["id"]
+            ],
+            key=lambda row: (row["subject"], row["class"], row["hours"])
+        )
+        teacher["tasks"] = sorted(
+            [
+                {"name": tasks[a["additional_task_id"]][0], "hours": tasks[a["additional_task_id"]][1]}
+                for a in task_assignments
+                if a["teacher_id"] == teacher["id"] and a["additional_task_id"] in tasks
+            ],
+            key=lambda row: (row["name"], row["hours"])
+        )
+
+    return {
+        "school": school,
+        "academic_year": academic_year,
+        "teachers": teachers,
+        "place": request.place,
+        "date": request.date
+    }
+
+def sk_content_hash(template: dict, data: dict):
+    payload = json.dumps(
+        {"template_id": template["id"], "template_version": template["version"], "data": data},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def sk_document_from_file(file: dict, reused: bool = False):
+    metadata = file["metadata"]
+    return SKDocument(
+        id=str(file["_id"]),
+        filename=file["filename"],
+        length=file["length"],
+        content_hash=metadata["content_hash"],
+        template_id=metadata["template_id"],
+        template_version=metadata["template_version"],
+        academic_year_id=metadata["academic_year_id"],
+        teacher_id=metadata.get("teacher_id"),
+        upload_date=file["uploadDate"],
+        reused=reused
+    )
+
+def parse_file_id(file_id: str):
+    try:
+        return ObjectId(file_id)
+    except InvalidId:
+        raise HTTPException(status_code=404, detail="SK document not found")
+
+# SK Archive Routes
+@api_router.post("/sk-archive", response_model=SKDocument)
+async def generate_sk(request: SKGenerateRequest, school_id: str = Depends(get_school_id)):
+    template = await db.sk_templates.find_one({"id": request.template_id, "school_id": school_id})
+    if not template:
+        raise HTTPException(status_code=404, detail="SK template not found")
+    data = await collect_sk_data(request, template["sk_type"], school_id)
+    content_hash = sk_content_hash(template, data)
+    files = db["sk_archive.files"]
+
+    existing = await files.find_one({"metadata.school_id": school_id, "metadata.content_hash": content_hash})
+    if existing:
+        return sk_document_from_file(existing, reused=True)
+
+    document = load_subsystem("exports").render_sk_document(template, data)
+    teacher_name = data["teachers"][0]["name"] if template["sk_type"] == "individu" else "Semua Guru"
+    filename = f"SK {template['name']} - {teacher_name} - {data['academic_year']['school_year'].replace('/', '-')}.html"
+    metadata = {
+        "school_id": school_id,
+        "content_hash": content_hash,
+        "content_type": "text/html",
+        "template_id": template["id"],
+        "template_version": template["version"],
+        "academic_year_id": request.academic_year_id,
+        "teacher_id": request.teacher_id if template["sk_type"] == "individu" else None
+    }
+    bucket = sk_bucket()
+    file_id = ObjectId()
+    try:
+        await bucket.upload_from_stream_with_id(file_id, filename, document, metadata=metadata)
+    except DuplicateKeyError:
+        # A concurrent request archived the same SK first; drop our orphaned chunks
+        await db["sk_archive.chunks"].delete_many({"files_id": file_id})
+        existing = await files.find_one({"metadata.school_id": school_id, "metadata.content_hash": content_hash})
+        return sk_document_from_file(existing, reused=True)
+    return sk_document_from_file(await files.find_one({"_id": file_id}))
+
+@api_router.get("/sk-archive", response_model=List[SKDocument])
+async def get_sk_archive(academic_year_id: Optional[str] = None, teacher_id: Optional[str] = None, school_id: str = Depends(get_school_id)):
+    query = {"metadata.school_id": school_id}
+    if academic_year_id:
+        query["metadata.academic_year_id"] = academic_year_id
+    if teacher_id:
+        query["metadata.teacher_id"] = teacher_id
+    files = await db["sk_archive.files"].find(query).sort("uploadDate", -1).to_list(None)
+    return [sk_document_from_file(file) for file in files]
+
+def content_disposition(filename: str) -> str:
+    # Header values must be latin-1: send an ASCII fallback plus the UTF-8 name (RFC 6266/5987)
+    fallback = "".join(c if " " <= c < "\x7f" and c not in '"\\' else "_" for c in filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+@api_router.get("/sk-archive/{file_id}/download")
+async def download_sk(file_id: str, range_header: Optional[str] = Header(None, alias="Range"), school_id: str = Depends(get_school_id)):
+    file = await db["sk_archive.files"].find_one({"_id": parse_file_id(file_id), "metadata.school_id": school_id})
+    if not file:
+        raise HTTPException(status_code=404, detail="SK document not found")
+
+    length = file["length"]
+    start, end = 0, length - 1
+    status_code = status.HTTP_200_OK
+    unit, _, spec = (range_header or "").partition("=")
+    # Multi-range and non-byte requests are ignored and served in full (RFC 7233)
+    if unit.strip() == "bytes" and "," not in spec:
+        try:
+            first, _, last = spec.partition("-")
+            if first:
+                start = int(first)
+                end = min(int(last), length - 1) if last else length - 1
+            else:
+                start = max(length - int(last), 0)
+            if start > end or start >= length:
+                raise ValueError
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail="Invalid range",
+                headers={"Content-Range": f"bytes */{length}"}
+            )
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+
+    try:
+        grid_out = await sk_bucket().open_download_stream(file["_id"])
+    except NoFile:
+        raise HTTPException(status_code=404, detail="SK document not found")
+    grid_out.seek(start)
+
+    async def stream():
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await grid_out.read(min(file["chunkSize"], remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        # Keeps GZipMiddleware off the body, so Content-Length/Content-Range stay byte-exact
+        "Content-Encoding": "identity",
+        "Content-Length": str(end - start + 1),
+        "Content-Disposition": content_disposition(file["filename"])
+    }
+    if status_code == status.HTTP_206_PARTIAL_CONTENT:
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    return StreamingResponse(
+        stream(), status_code=status_code, headers=headers,
+        media_type=file["metadata"].get("content_type", "application/octet-stream")
+    )
+
+@api_router.delete("/sk-archive/{file_id}")
+async def delete_sk(file_id: str, school_id: str = Depends(get_school_id)):
+    file = await db["sk_archive.files"].find_one({"_id": parse_file_id(file_id), "metadata.school_id": school_id})
+    if not file:
+        raise HTTPException(status_code=404, detail="SK document not found")
+    await sk_bucket().delete(file["_id"])
+    return {"message": "SK document deleted successfully"}
+
 # Dashboard Stats
 @api_router.get("/dashboard/stats")
-async def get_dashboard_stats(token_data: dict = Depends(verify_token)):
-    schools_count = await db.schools.count_documents({})
-    teachers_count = await db.teachers.count_documents({})
-    subjects_count = await db.subjects.count_documents({})
-    classes_count = await db.classes.count_documents({})
+async def get_dashboard_stats(school_id: str = Depends(get_school_id)):
+    schools_count = await db.schools.count_documents({"id": school_id})
+    teachers_count = await db.teachers.count_documents({"school_id": school_id})
+    subjects_count = await db.subjects.count_documents({"school_id": school_id})
+    classes_count = await db.classes.count_documents({"school_id": school_id})
     
     return {
         "schools": schools_count,
@@ -378,6 +1400,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Whole-school timetables are large; compress them on the wire
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -385,6 +1410,48 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+@app.exception_handler(DuplicateKeyError)
+async def duplicate_key_handler(request, exc: DuplicateKeyError):
+    return JSONResponse(status_code=409, content={"detail": "Data already exists"})
+
+# Secondary indexes of the school-scoped collections. Every index leads with
+# school_id so per-school queries stay cheap however many tenants share the db.
+TENANT_INDEXES = {
+    "teachers": [["name"]],
+    "subjects": [["code"]],
+    "classes": [["level", "group"]],
+    "academic_years": [["school_year", "semester"]],
+    "additional_tasks": [["name"]],
+    "teaching_assignments": [],
+    "task_assignments": [],
+    "schedule_templates": [],
+    "schedule_slots": [["academic_year_id", "day", "slot"]],
+    "sk_templates": []
+}
+
+async def create_indexes():
+    await db.schools.create_index("id", unique=True)
+    for collection, indexes in TENANT_INDEXES.items():
+        await db[collection].create_index([("school_id", 1), ("id", 1)], unique=True)
+        for keys in indexes:
+            await db[collection].create_index([("school_id", 1)] + [(key, 1) for key in keys])
+    for collection, keys in ROLLOVER_COLLECTIONS.items():
+        await db[collection].create_index(
+            [("school_id", 1), ("academic_year_id", 1)] + [(key, 1) for key in keys], unique=True
+        )
+    # Back the clash check, so concurrent writes cannot double-book a class or teacher
+    for owner in ("class_id", "teacher_id"):
+        await db.schedule_slots.create_index(
+            [("school_id", 1), ("academic_year_id", 1), ("day", 1), ("slot", 1), (owner, 1)],
+            unique=True,
+            partialFilterExpression={"template_id": {"$type": "string"}}
+        )
+    await db.schedule_views.create_index(
+        [("school_id", 1), ("academic_year_id", 1), ("view", 1), ("key_id", 1)], unique=True
+    )
+    await db["sk_archive.files"].create_index(
+        [("metadata.school_id", 1), ("metadata.content_hash", 1)], unique=True
+    )
+    await db["sk_archive.files"].create_index(
+        [("metadata.school_id", 1), ("metadata.academic_year_id", 1), ("metadata.teacher_id", 1)]
+    )
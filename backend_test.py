@@ -15,7 +15,8 @@ class AdifathiAPITester:
             'subjects': [],
             'classes': [],
             'academic_years': [],
-            'additional_tasks': []
+            'additional_tasks': [],
+            'schedules': []
         }
 
     def run_test(self, name, method, endpoint, expected_status, data=None, headers=None):
@@ -102,6 +103,15 @@ class AdifathiAPITester:
             if me_success:
                 print(f"   User info: {me_response}")
             
+            # With none or several schools the login is unscoped until a school is picked
+            if not response['user'].get('school_id'):
+                self.run_test(
+                    "Unscoped Session Is Rejected",
+                    "GET",
+                    "dashboard/stats",
+                    401
+                )
+            
             return True
         else:
             print("❌ Authentication failed - cannot proceed with other tests")
@@ -142,6 +152,20 @@ class AdifathiAPITester:
             school_id = response['id']
             self.created_resources['schools'].append(school_id)
             print(f"   Created school ID: {school_id}")
+            
+            # Creating a school hands back a session scoped to it
+            if response.get('access_token'):
+                self.token = response['access_token']
+            else:
+                print("❌ Created school did not return a scoped session")
+            
+            # A session bound to one school cannot switch into another
+            self.run_test(
+                "Switch To Another School",
+                "POST",
+                "auth/switch-school/another-school",
+                403
+            )
         
         # Get all schools
         self.run_test(
@@ -367,6 +391,353 @@ class AdifathiAPITester:
             200
         )
 
+    def test_academic_year_rollover(self):
+        """Test cloning assignments into a new academic year"""
+        print("\n" + "="*50)
+        print("TESTING ACADEMIC YEAR ROLLOVER")
+        print("="*50)
+        
+        year_ids = []
+        for semester in ("Gasal", "Genap"):
+            success, response = self.run_test(
+                f"Create Academic Year ({semester})",
+                "POST",
+                "academic-years",
+                200,
+                data={
+                    "school_year": "2024/2025",
+                    "semester": semester,
+                    "curriculum": "Kurikulum Merdeka",
+                    "max_time_allocation": 40
+                }
+            )
+            if success and 'id' in response:
+                year_ids.append(response['id'])
+                self.created_resources['academic_years'].append(response['id'])
+        
+        if len(year_ids) != 2:
+            return
+        
+        self.run_test(
+            "Create Teaching Assignment",
+            "POST",
+            "teaching-assignments",
+            200,
+            data={
+                "academic_year_id": year_ids[0],
+                "teacher_id": "test-teacher",
+                "subject_id": "test-subject",
+                "class_id": "test-class",
+                "weekly_hours": 4
+            }
+        )
+        
+        rollover_endpoint = f"academic-years/{year_ids[1]}/rollover"
+        success, response = self.run_test(
+            "Rollover Dry Run",
+            "POST",
+            rollover_endpoint,
+            200,
+            data={"source_academic_year_id": year_ids[0], "dry_run": True}
+        )
+        if success and response['collections']['teaching_assignments']['insert'] != 1:
+            print(f"❌ Unexpected rollover diff: {response}")
+        
+        self.run_test(
+            "Rollover",
+            "POST",
+            rollover_endpoint,
+            200,
+            data={"source_academic_year_id": year_ids[0]}
+        )
+        
+        # Running it again must not copy anything twice
+        success, response = self.run_test(
+            "Rollover Again",
+            "POST",
+            rollover_endpoint,
+            200,
+            data={"source_academic_year_id": year_ids[0], "dry_run": True}
+        )
+        if success and response['collections']['teaching_assignments']['insert'] != 0:
+            print(f"❌ Rollover is not idempotent: {response}")
+
+    def test_schedule_templates(self):
+        """Test schedule templates and their expanded slot table"""
+        print("\n" + "="*50)
+        print("TESTING SCHEDULE TEMPLATES")
+        print("="*50)
+        
+        template_data = {
+            "academic_year_id": "test-academic-year",
+            "name": "Template Reguler",
+            "days_per_week": 5,
+            "lessons_per_day": 2,
+            "lesson_duration": 40,
+            "start_time": "07:00",
+            "slots": [
+                {"slot_type": "belajar"},
+                {"slot_type": "istirahat", "duration": 15},
+                {"slot_type": "belajar"}
+            ]
+        }
+        
+        success, response = self.run_test(
+            "Create Schedule Template",
+            "POST",
+            "schedule-templates",
+            200,
+            data=template_data
+        )
+        
+        if success and 'id' in response:
+            template_id = response['id']
+            table_success, table = self.run_test(
+                "Get Template Slot Table",
+                "GET",
+                f"schedule-templates/{template_id}/slot-table",
+                200
+            )
+            if table_success and [row['end_time'] for row in table] != ["07:40", "07:55", "08:35"]:
+                print(f"❌ Unexpected slot table: {table}")
+            
+            self.run_test(
+                "Delete Schedule Template",
+                "DELETE",
+                f"schedule-templates/{template_id}",
+                200
+            )
+        
+        # Lesson durations other than 40/30/20 are rejected
+        self.run_test(
+            "Create Template With Invalid Duration",
+            "POST",
+            "schedule-templates",
+            400,
+            data={**template_data, "lesson_duration": 45}
+        )
+        
+        self.run_test(
+            "Create Template With Invalid Start Time",
+            "POST",
+            "schedule-templates",
+            400,
+            data={**template_data, "start_time": "99:99"}
+        )
+        
+        self.run_test(
+            "Create Template Past Midnight",
+            "POST",
+            "schedule-templates",
+            400,
+            data={**template_data, "start_time": "23:20"}
+        )
+
+    def test_schedules(self):
+        """Test schedule slots and their class/teacher/subject views"""
+        print("\n" + "="*50)
+        print("TESTING SCHEDULES")
+        print("="*50)
+        
+        template_success, template = self.run_test(
+            "Create Schedule Template For Slots",
+            "POST",
+            "schedule-templates",
+            200,
+            data={
+                "academic_year_id": "test-academic-year",
+                "name": "Template Slot Test",
+                "days_per_week": 5,
+                "lessons_per_day": 2,
+                "lesson_duration": 40
+            }
+        )
+        if not template_success:
+            return
+        
+        slot_data = {
+            "academic_year_id": "test-academic-year",
+            "day": 0,
+            "slot": 1,
+            "class_id": "test-class",
+            "teacher_id": "test-teacher",
+            "subject_id": "test-subject",
+            "template_id": template['id']
+        }
+        
+        success, response = self.run_test(
+            "Create Schedule Slot",
+            "POST",
+            "schedules",
+            200,
+            data=slot_data
+        )
+        
+        if success and 'id' in response:
+            slot_id = response['id']
+            self.created_resources['schedules'].append(slot_id)
+            
+            # The slot must show up in each projected view
+            for view, key_id in (("class", "test-class"), ("teacher", "test-teacher"), ("subject", "test-subject")):
+                view_success, view_response = self.run_test(
+                    f"Get {view.title()} Schedule View",
+                    "GET",
+                    f"schedules/views/{view}/{key_id}?academic_year_id=test-academic-year",
+                    200
+                )
+                if view_success and slot_id not in [s['id'] for s in view_response.get('slots', [])]:
+                    print(f"❌ Slot {slot_id} missing from {view} view")
+            
+            col_success, col_response = self.run_test(
+                "Get Schedule (columnar)",
+                "GET",
+                "schedules?academic_year_id=test-academic-year&format=columnar",
+                200
+            )
+            if col_success:
+                # Decode the cell the same way frontend/src/lib/columnar.js does
+                try:
+                    class_index = col_response['classes'].index("test-class")
+                    cell = (0 * col_response['slots'] + 1) * len(col_response['classes']) + class_index
+                    decoded = {
+                        "id": col_response['ids'][cell],
+                        "teacher_id": col_response['teachers'][col_response['teacher'][cell]],
+                        "subject_id": col_response['subjects'][col_response['subject'][cell]]
+                    }
+                except (ValueError, IndexError, KeyError) as e:
+                    decoded = {"error": str(e)}
+                expected = {"id": slot_id, "teacher_id": "test-teacher", "subject_id": "test-subject"}
+                if decoded != expected:
+                    print(f"❌ Columnar cell decoded to {decoded}, expected {expected}")
+            
+            # Days outside the week are rejected before they reach the grid
+            self.run_test(
+                "Create Schedule Slot Outside Week",
+                "POST",
+                "schedules",
+                422,
+                data={**slot_data, "day": -1}
+            )
+            
+            # Another teacher in the same class and cell is a clash
+            self.run_test(
+                "Create Clashing Schedule Slot",
+                "POST",
+                "schedules",
+                409,
+                data={**slot_data, "teacher_id": "other-teacher"}
+            )
+            
+            # Inserting a break before lesson 2 would move the scheduled lesson
+            self.run_test(
+                "Edit Template Under Scheduled Lesson",
+                "PUT",
+                f"schedule-templates/{template['id']}",
+                409,
+                data={
+                    "academic_year_id": "test-academic-year",
+                    "name": "Template Slot Test",
+                    "days_per_week": 5,
+                    "lessons_per_day": 2,
+                    "lesson_duration": 40,
+                    "slots": [
+                        {"slot_type": "belajar"},
+                        {"slot_type": "istirahat", "duration": 15},
+                        {"slot_type": "belajar"}
+                    ]
+                }
+            )
+            
+            self.run_test(
+                "Delete Schedule Slot",
+                "DELETE",
+                f"schedules/{slot_id}",
+                200
+            )
+        
+        self.run_test(
+            "Delete Schedule Template",
+            "DELETE",
+            f"schedule-templates/{template['id']}",
+            200
+        )
+
+    def test_sk_archive(self):
+        """Test SK generation, deduplication and ranged downloads"""
+        print("\n" + "="*50)
+        print("TESTING SK ARCHIVE")
+        print("="*50)
+        
+        if not self.created_resources['academic_years'] or not self.created_resources['teachers']:
+            print("   Skipped - needs an academic year and a teacher")
+            return
+        
+        success, template = self.run_test(
+            "Create SK Template",
+            "POST",
+            "sk-templates",
+            200,
+            data={
+                "name": "SK Pembagian Tugas",
+                "sk_type": "individu",
+                "content": "<h1>{{sekolah}}</h1><p>{{nama_guru}}</p>{{tabel_jtm}}{{tabel_ttg}}<p>{{tempat}}, {{tanggal}}</p>"
+            }
+        )
+        if not success:
+            return
+        
+        sk_data = {
+            "template_id": template['id'],
+            "academic_year_id": self.created_resources['academic_years'][0],
+            "teacher_id": self.created_resources['teachers'][0],
+            "place": "Jakarta",
+            "date": "15 Juli 2024"
+        }
+        success, first = self.run_test("Generate SK", "POST", "sk-archive", 200, data=sk_data)
+        success_again, second = self.run_test("Generate Unchanged SK", "POST", "sk-archive", 200, data=sk_data)
+        if success and success_again and (not second.get('reused') or second['id'] != first['id']):
+            print("❌ Unchanged SK was rendered and stored again")
+        
+        if success:
+            self.run_test(
+                "Download SK Range",
+                "GET",
+                f"sk-archive/{first['id']}/download",
+                206,
+                headers={"Range": "bytes=0-99"}
+            )
+            self.run_test(
+                "Download SK Multi-Range Served In Full",
+                "GET",
+                f"sk-archive/{first['id']}/download",
+                200,
+                headers={"Range": "bytes=0-9,20-29"}
+            )
+            self.check_ranged_download_not_compressed(first['id'])
+
+    def check_ranged_download_not_compressed(self, file_id):
+        """A ranged download above the gzip threshold must stay byte-exact"""
+        self.tests_run += 1
+        print("\n🔍 Testing Download SK Range Not Gzipped...")
+        response = requests.get(
+            f"{self.base_url}/sk-archive/{file_id}/download",
+            headers={'Authorization': f'Bearer {self.token}', 'Range': 'bytes=0-1499', 'Accept-Encoding': 'gzip'},
+            stream=True,
+            timeout=10
+        )
+        body = response.raw.read(decode_content=False)
+        total = int(response.headers.get('Content-Range', '/0').rsplit('/', 1)[1])
+        expected_length = min(1500, total)
+        if (response.status_code == 206
+                and total > 1000
+                and response.headers.get('Content-Encoding') != 'gzip'
+                and response.headers.get('Content-Length') == str(expected_length)
+                and len(body) == expected_length):
+            self.tests_passed += 1
+            print(f"✅ Passed - {len(body)} plain bytes of {total}")
+        else:
+            print(f"❌ Failed - status {response.status_code}, headers {dict(response.headers)}, body {len(body)} bytes")
+
     def test_dashboard_stats(self):
         """Test dashboard statistics"""
         print("\n" + "="*50)
@@ -383,6 +754,18 @@ class AdifathiAPITester:
         if success:
             print(f"   Dashboard stats: {response}")
 
+    def test_health(self):
+        """Test liveness and readiness probes (no token required)"""
+        print("\n" + "="*50)
+        print("TESTING HEALTH PROBES")
+        print("="*50)
+        
+        old_token = self.token
+        self.token = None
+        self.run_test("Liveness", "GET", "health/live", 200)
+        self.run_test("Readiness", "GET", "health/ready", 200)
+        self.token = old_token
+
     def test_error_handling(self):
         """Test error handling scenarios"""
         print("\n" + "="*50)
@@ -418,6 +801,8 @@ def main():
     
     tester = AdifathiAPITester()
     
+    tester.test_health()
+    
     # Run authentication tests first
     if not tester.test_authentication():
         print("\n❌ Authentication failed - stopping tests")
@@ -430,6 +815,10 @@ def main():
     tester.test_classes_crud()
     tester.test_academic_years_crud()
     tester.test_additional_tasks_crud()
+    tester.test_academic_year_rollover()
+    tester.test_schedule_templates()
+    tester.test_schedules()
+    tester.test_sk_archive()
     
     # Test dashboard
     tester.test_dashboard_stats()
@@ -70,6 +70,21 @@ const AuthProvider = ({ children }) => {
     }
   }, [token]);
 
+  // A 401 on an authenticated request means the session is unusable (expired,
+  // no school selected, school deleted): drop it so the user logs in again.
+  useEffect(() => {
+    const interceptor = axios.interceptors.response.use(
+      (response) => response,
+      (error) => {
+        if (error.response?.status === 401 && error.config?.headers?.Authorization) {
+          logout();
+        }
+        return Promise.reject(error);
+      }
+    );
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
+
   return (
     <AuthContext.Provider value={{ token, user, login, logout }}>
       {children}
@@ -91,6 +106,10 @@ const Login = () => {
   const [password, setPassword] = useState('');
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
+  // Set when the login is not tied to a school yet: the unscoped session and the schools to pick from
+  const [session, setSession] = useState(null);
+  const [schools, setSchools] = useState([]);
+  const [schoolId, setSchoolId] = useState('');
   const { login } = useAuth();
   const navigate = useNavigate();
 
@@ -101,10 +120,44 @@ const Login = () => {
 
     try {
       const response = await axios.post('/auth/login', { username, password });
+      const { access_token, user } = response.data;
+      if (user.school_id) {
+        login(access_token, user);
+        navigate('/dashboard');
+        return;
+      }
+      const schoolsResponse = await axios.get('/schools', {
+        headers: { Authorization: `Bearer ${access_token}` }
+      });
+      if (schoolsResponse.data.length === 0) {
+        // Fresh install: register the first school, which returns a scoped session
+        login(access_token, user);
+        navigate('/master/schools');
+        return;
+      }
+      setSession(response.data);
+      setSchools(schoolsResponse.data);
+      setSchoolId(schoolsResponse.data[0].id);
+    } catch (err) {
+      setError(err.response?.data?.detail || 'Login gagal');
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  const handleSelectSchool = async (e) => {
+    e.preventDefault();
+    setLoading(true);
+    setError('');
+
+    try {
+      const response = await axios.post(`/auth/switch-school/${schoolId}`, null, {
+        headers: { Authorization: `Bearer ${session.access_token}` }
+      });
       login(response.data.access_token, response.data.user);
       navigate('/dashboard');
     } catch (err) {
-      setError(err.response?.data?.detail || 'Login gagal');
+      setError(err.response?.data?.detail || 'Gagal memilih sekolah');
     } finally {
       setLoading(false);
     }
@@ -121,6 +174,41 @@ const Login = () => {
           <p className="text-gray-300">Sistem Manajemen Jadwal Sekolah</p>
         </div>
 
+        {session ? (
+          <form onSubmit={handleSelectSchool} className="space-y-6">
+            {error && (
+              <div className="bg-red-500/20 border border-red-500/50 rounded-lg p-3 text-red-300 text-sm">
+                {error}
+              </div>
+            )}
+
+            <div>
+              <label className="block text-gray-300 text-sm font-medium mb-2">
+                Sekolah
+              </label>
+              <select
+                value={schoolId}
+                onChange={(e) => setSchoolId(e.target.value)}
+                className="w-full px-4 py-3 bg-white/10 border border-white/20 rounded-lg text-white focus:outline-none focus:ring-2 focus:ring-blue-500 focus:border-transparent"
+                required
+              >
+                {schools.map((school) => (
+                  <option key={school.id} value={school.id} className="text-slate-900">
+                    {school.name} ({school.npsn})
+                  </option>
+                ))}
+              </select>
+            </div>
+
+            <button
+              type="submit"
+              disabled={loading}
+              className="w-full bg-blue-600 hover:bg-blue-700 disabled:bg-blue-800 text-white font-medium py-3 px-4 rounded-lg transition-colors duration-200 focus:outline-none focus:ring-2 focus:ring-blue-500 focus:ring-offset-2 focus:ring-offset-slate-900"
+            >
+              {loading ? 'Memproses...' : 'Pilih Sekolah'}
+            </button>
+          </form>
+        ) : (
         <form onSubmit={handleSubmit} className="space-y-6">
           {error && (
             <div className="bg-red-500/20 border border-red-500/50 rounded-lg p-3 text-red-300 text-sm">
@@ -164,6 +252,7 @@ const Login = () => {
             {loading ? 'Memproses...' : 'Masuk'}
           </button>
         </form>
+        )}
 
         <div className="mt-6 text-center text-gray-400 text-sm">
           <p>Username: admin | Password: Adifathi2020</p>
@@ -504,13 +593,24 @@ const Layout = ({ children }) => {
   );
 };
 
+// Schools page; creating a school returns a session scoped to it
+const SchoolManagementPage = () => {
+  const { user, login } = useAuth();
+  return <SchoolManagement onSession={login} scoped={Boolean(user?.school_id)} />;
+};
+
 // Protected Route Component
-const ProtectedRoute = ({ children }) => {
-  const { token } = useAuth();
+const ProtectedRoute = ({ children, allowUnscoped = false }) => {
+  const { token, user } = useAuth();
   
   if (!token) {
     return <Navigate to="/login" replace />;
   }
+
+  // Without a school only the schools page works: register or pick a school there
+  if (!user?.school_id && !allowUnscoped) {
+    return <Navigate to="/master/schools" replace />;
+  }
   
   return <Layout>{children}</Layout>;
 };
@@ -532,8 +632,8 @@ function App() {
           
           {/* Master Data Routes */}
           <Route path="/master/schools" element={
-            <ProtectedRoute>
-              <SchoolManagement />
+            <ProtectedRoute allowUnscoped>
+              <SchoolManagementPage />
             </ProtectedRoute>
           } />
           <Route path="/master/teachers" element={
@@ -9,10 +9,12 @@ import {
   School,
   MapPin,
   User,
-  FileText
+  FileText,
+  LogIn
 } from 'lucide-react';
 
-const SchoolManagement = () => {
+// `scoped` is false while the session has no school yet; the list then lets the user pick one
+const SchoolManagement = ({ onSession, scoped = true }) => {
   const [schools, setSchools] = useState([]);
   const [loading, setLoading] = useState(false);
   const [showModal, setShowModal] = useState(false);
@@ -58,7 +60,11 @@ const SchoolManagement = () => {
         await axios.put(`/schools/${editingSchool.id}`, formData);
         showNotification('Data sekolah berhasil diperbarui', 'success');
       } else {
-        await axios.post('/schools', formData);
+        const response = await axios.post('/schools', formData);
+        // The new school becomes the working school
+        if (response.data.access_token && onSession) {
+          onSession(response.data.access_token, response.data.user);
+        }
         showNotification('Data sekolah berhasil ditambahkan', 'success');
       }
       
@@ -71,6 +77,18 @@ const SchoolManagement = () => {
     }
   };
 
+  const handleSelect = async (school) => {
+    try {
+      const response = await axios.post(`/auth/switch-school/${school.id}`);
+      onSession(response.data.access_token, response.data.user);
+      showNotification(`Sekolah ${school.name} dipilih`, 'success');
+      await fetchSchools();
+    } catch (error) {
+      const errorMessage = error.response?.data?.detail || 'Gagal memilih sekolah';
+      showNotification(errorMessage, 'error');
+    }
+  };
+
   const handleEdit = (school) => {
     setEditingSchool(school);
     setFormData({
@@ -204,20 +222,33 @@ const SchoolManagement = () => {
                     </td>
                     <td>
                       <div className="flex items-center space-x-2">
-                        <button
-                          onClick={() => handleEdit(school)}
-                          className="p-2 text-blue-400 hover:text-blue-300 hover:bg-blue-900/20 rounded-lg transition-colors"
-                          title="Edit"
-                        >
-                          <Edit className="w-4 h-4" />
-                        </button>
-                        <button
-                          onClick={() => handleDelete(school.id)}
-                          className="p-2 text-red-400 hover:text-red-300 hover:bg-red-900/20 rounded-lg transition-colors"
-                          title="Hapus"
-                        >
-                          <Trash2 className="w-4 h-4" />
-                        </button>
+                        {!scoped && onSession && (
+                          <button
+                            onClick={() => handleSelect(school)}
+                            className="p-2 text-green-400 hover:text-green-300 hover:bg-green-900/20 rounded-lg transition-colors"
+                            title="Pilih"
+                          >
+                            <LogIn className="w-4 h-4" />
+                          </button>
+                        )}
+                        {scoped && (
+                          <>
+                            <button
+                              onClick={() => handleEdit(school)}
+                              className="p-2 text-blue-400 hover:text-blue-300 hover:bg-blue-900/20 rounded-lg transition-colors"
+                              title="Edit"
+                            >
+                              <Edit className="w-4 h-4" />
+                            </button>
+                            <button
+                              onClick={() => handleDelete(school.id)}
+                              className="p-2 text-red-400 hover:text-red-300 hover:bg-red-900/20 rounded-lg transition-colors"
+                              title="Hapus"
+                            >
+                              <Trash2 className="w-4 h-4" />
+                            </button>
+                          </>
+                        )}
                       </div>
                     </td>
                   </tr>
@@ -0,0 +1,38 @@
+// Decoder for the `format=columnar` schedule payload served by the backend.
+// Cell (day, slot, class) lives at index (day * slots + slot) * classes.length + class.
+
+export function columnarCellIndex(payload, day, slot, classIndex) {
+  return (day * payload.slots + slot) * payload.classes.length + classIndex;
+}
+
+export function getColumnarCell(payload, day, slot, classIndex) {
+  const cell = columnarCellIndex(payload, day, slot, classIndex);
+  const teacher = payload.teacher[cell];
+  if (teacher === undefined || teacher < 0) {
+    return null;
+  }
+  return {
+    id: payload.ids[cell],
+    day,
+    slot,
+    class_id: payload.classes[classIndex],
+    teacher_id: payload.teachers[teacher],
+    subject_id: payload.subjects[payload.subject[cell]],
+    is_locked: payload.locked[cell] === 1
+  };
+}
+
+export function decodeColumnarSchedule(payload) {
+  const rows = [];
+  for (let day = 0; day < payload.days; day++) {
+    for (let slot = 0; slot < payload.slots; slot++) {
+      for (let classIndex = 0; classIndex < payload.classes.length; classIndex++) {
+        const row = getColumnarCell(payload, day, slot, classIndex);
+        if (row) {
+          rows.push(row);
+        }
+      }
+    }
+  }
+  return rows;
+}
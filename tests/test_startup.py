@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# Cold-start budgets in seconds; override on slow CI machines
+IMPORT_BUDGET = float(os.environ.get("STARTUP_IMPORT_BUDGET", "2.0"))
+FIRST_REQUEST_BUDGET = float(os.environ.get("STARTUP_FIRST_REQUEST_BUDGET", "3.0"))
+
+LAZY_MODULES = ["pandas", "numpy", "boto3", "exports", "scheduler"]
+
+# Runs in a fresh interpreter so nothing is already imported. The first request
+# goes straight through the ASGI app (no lifespan, so no MongoDB needed).
+STARTUP_SCRIPT = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+
+async def first_request():
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/api/health/live", "raw_path": b"/api/health/live",
+        "query_string": b"", "root_path": "", "headers": [], "client": ("test", 0), "server": ("test", 80)
+    }
+    messages = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        messages.append(message)
+    await server.app(scope, receive, send)
+    return messages[0]["status"]
+
+status = asyncio.run(first_request())
+done = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - start,
+    "first_request_seconds": done - start,
+    "status": status,
+    "loaded": [name for name in %r if name in sys.modules]
+}))
+""" % (LAZY_MODULES,)
+
+
+@pytest.fixture(scope="module")
+def startup():
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_heavy_modules_are_not_loaded_at_startup(startup):
+    assert startup["loaded"] == []
+
+
+def test_import_time_within_budget(startup):
+    print(f"server import: {startup['import_seconds']:.3f}s")
+    assert startup["import_seconds"] < IMPORT_BUDGET
+
+
+def test_time_to_first_request_within_budget(startup):
+    print(f"time to first request: {startup['first_request_seconds']:.3f}s")
+    assert startup["status"] == 200
+    assert startup["first_request_seconds"] < FIRST_REQUEST_BUDGET